@@ -6,10 +6,11 @@ from ..postprocessors import Postprocessor
 from .codehilite import CodeHilite, CodeHiliteExtension, parse_hl_lines
 from .attr_list import get_attrs, AttrListExtension
 from ..util import parseBoolValue
-import copy
-from collections import OrderedDict
+import functools
+from collections import defaultdict
 import regex as re
 import hashlib
+import json
 if WHEEL_MODE:
     from linear_algebra.iheartla.la_parser.parser import compile_la_content, ParserTypeEnum
     from linear_algebra.iheartla.la_tools.la_helper import DEBUG_MODE, read_from_file, save_to_file, la_warning, la_debug, get_file_base, record
@@ -20,15 +21,46 @@ else:
 
 cached_data = {}
 
+# Negative lookbehind shared by every symbol pattern: the symbol must not already
+# sit inside an emitted prose label or follow other letters; only the (symbol)
+# tail varies per symbol, so the constant part is dedented once at import time
+_PROSE_PREFIX = dedent(r'''(?<!(    # negative begins
+                                                (\\(proselabel|prosedeflabel)({([a-z0-9\p{Ll}\p{Lu}\p{Lo}\p{M}\s]+)})?{([a-z\p{Ll}\p{Lu}\p{Lo}\p{M}_{()\\\s]*)))
+                                                |
+                                                ([a-zA-Z]+)
+                                                ) # negative ends
+                                                ''')
+_PROSE_SUFFIX = r'(?![a-zA-Z]+)'
+
+
+# Special characters that need to be escaped in regular expression
+_ESCAPE_TABLE = str.maketrans({c: '\\' + c for c in '\\(){}^+-.* '})
+
+
+@functools.lru_cache(maxsize=4096)
+def _escape_sym(sym):
+    return sym.translate(_ESCAPE_TABLE)
+
+
+@functools.lru_cache(maxsize=2048)
+def _prose_re_for(sym_escaped):
+    """
+    Compile (and cache) the symbol pattern for an escaped symbol
+    """
+    return re.compile(
+        _PROSE_PREFIX + '(' + sym_escaped + ')' + _PROSE_SUFFIX,
+        re.MULTILINE | re.DOTALL | re.VERBOSE
+    )
+
 
 class BlockData(Extension):
-    def __init__(self, match_list=[], code_list=[], block_list=[], inline_list=[], number_list=[], module_name=''):
+    def __init__(self, match_list=None, code_list=None, block_list=None, inline_list=None, number_list=None, module_name=''):
         self.module_name = module_name
-        self.match_list = match_list
-        self.code_list = code_list
-        self.block_list = block_list
-        self.inline_list = inline_list
-        self.number_list = number_list
+        self.match_list = match_list if match_list is not None else []
+        self.code_list = code_list if code_list is not None else []
+        self.block_list = block_list if block_list is not None else []
+        self.inline_list = inline_list if inline_list is not None else []
+        self.number_list = number_list if number_list is not None else []
         self.math_pre = ''
         self.math_list = []
         self.math_post = ''
@@ -126,11 +158,6 @@ class IheartlaBlockPreprocessor(Preprocessor):
         dedent(r'''<span\ class=(?P<quote>"|')def:(?P<context>[^\n:❤'"]*)(:)(?P<symbol>[^:>'"]*)(?P=quote)>(?P<code>.*?)</span>'''),
         re.MULTILINE | re.DOTALL | re.VERBOSE
     )
-    # Match string: <span class="def:symbol">***</span>
-    SPAN_SIMPLE_RE = re.compile(
-        dedent(r'''<span\ class=(?P<quote>"|')def:(?P<symbol>[^:>'"]*)(?P=quote)>(?P<code>.*?)(</span>)'''),
-        re.MULTILINE | re.DOTALL | re.VERBOSE
-    )
     # Match string: ❤️context: a=sin(θ)❤️
     INLINE_RE = re.compile(
         dedent(r'''❤(?P<module>[a-zA-Z0-9\.\t\r\f\v ]*)(:)(?P<code>.*?)❤'''),
@@ -146,29 +173,21 @@ class IheartlaBlockPreprocessor(Preprocessor):
         dedent(r'''(?<=(\n)*)([\t\r\f\v ]*)❤(\s*):(?P<context>[^\n❤]*)(?=\n)'''),
         re.MULTILINE | re.VERBOSE
     )
-    # Match string: ``` iheartla
-    RAW_CODE_BLOCK_RE = re.compile(
+    # Combined pass over raw fences (``` iheartla, ``` iheartla_unnumbered),
+    # inline code (❤ a=sin(θ)❤) and simple span tags (<span class="def:symbol">);
+    # exactly one branch matches
+    RAW_COMBINED_RE = re.compile(
         dedent(r'''
-            (?P<fence>^(?:~{3,}|`{3,}))[ ]*                          # opening fence
-            iheartla\s*
+            (?P<bfence>^(?:~{3,}|`{3,}))[ ]*                         # opening fence
+            iheartla(?P<unnumbered>_unnumbered)?\s*
             \n                                                       # newline (end of opening fence)
+            |
+            ❤(?P<icode>[^❤]*)❤                                       # inline iheartla code
+            |
+            <span\ class=(?P<squote>"|')def:(?P<ssymbol>[^:>'"]*)(?P=squote)>(?P<scode>.*?)(</span>)  # simple span tag
         '''),
         re.MULTILINE | re.DOTALL | re.VERBOSE
     )
-    # Match string: ``` iheartla_unnumbered
-    RAW_NUM_CODE_BLOCK_RE = re.compile(
-        dedent(r'''
-            (?P<fence>^(?:~{3,}|`{3,}))[ ]*                          # opening fence
-            iheartla_unnumbered\s*
-            \n                                                       # newline (end of opening fence)
-        '''),
-        re.MULTILINE | re.DOTALL | re.VERBOSE
-    )
-    # Match string: ❤ a=sin(θ)❤
-    RAW_CODE_INLINE_RE = re.compile(
-        dedent(r'''❤(?P<code>[^❤]*)❤'''),
-        re.MULTILINE | re.VERBOSE
-    )
     # Match string: \proselabel{A}  \prosedeflabel{A}
     PROSE_RE = re.compile(
         dedent(r'''\\prose(?P<def>(def)?)label\{(?P<symbol>[^{}$]*)\}(?!\{)'''),
@@ -187,20 +206,14 @@ class IheartlaBlockPreprocessor(Preprocessor):
         dedent(r'''[\n\s]*'''),
         re.MULTILINE | re.DOTALL | re.VERBOSE
     )
-    #
-    SYMBOL_FORMAT = r'''(?<!(    # negative begins
-                                                    (\\(proselabel|prosedeflabel)({{([a-z0-9\p{{Ll}}\p{{Lu}}\p{{Lo}}\p{{M}}\s]+)}})?{{([a-z\p{{Ll}}\p{{Lu}}\p{{Lo}}\p{{M}}_{{()\\\s]*)))
-                                                    |
-                                                    ([a-zA-Z]+)
-                                                    ) # negative ends
-                                                    ({})
-                                                    (?![a-zA-Z]+)'''
     def __init__(self, md, config):
         super().__init__(md)
         self.config = config
         self.checked_for_deps = False
         self.codehilite_conf = {}
         self.use_attr_list = False
+        # file name -> last written content, so unchanged output skips the disk entirely
+        self._file_content_cache = {}
         # List of options to convert to bool values
         self.bool_options = [
             'linenums',
@@ -213,10 +226,23 @@ class IheartlaBlockPreprocessor(Preprocessor):
         """
         Escape special characters in regular expression
         """
-        escape_list = ['\\', '(', ')', '{', '}', '^', '+', '-', '.', '*', ' ']
-        for es in escape_list:
-            sym = sym.replace(es, '\\' + es)
-        return sym
+        return _escape_sym(sym)
+
+    def _write_if_changed(self, content, file_name):
+        """
+        Save content to file, skipping the write when the file already holds the
+        same bytes so incremental renders don't trigger watcher rebuilds
+        """
+        if self._file_content_cache.get(file_name) == content:
+            return
+        try:
+            with open(file_name, 'r', encoding='utf-8') as f:
+                existing = f.read()
+        except OSError:
+            existing = None
+        if existing != content:
+            save_to_file(content, file_name)
+        self._file_content_cache[file_name] = content
 
     def handle_math(self, text, context, sym_list):
         """
@@ -226,47 +252,27 @@ class IheartlaBlockPreprocessor(Preprocessor):
         :param sym_list: symbol list
         :return: replaced text
         """
+        if not sym_list:
+            # segments outside any context have nothing to label
+            return text
         record("Begin handle_math")
-        text_list = []
-        start_index = 0
-        for m in self.MATH_RE.finditer(text):
+        def label_equation(m):
             content = m.group('code')
-            # print("current equation:{}".format(m.group()))
             updated = False
             for sym in sym_list:
-                PROSE_RE = re.compile(
-                    dedent(r'''(?<!(    # negative begins
-                    (\\(proselabel|prosedeflabel)({{([a-z0-9\p{{Ll}}\p{{Lu}}\p{{Lo}}\p{{M}}\s]+)}})?{{([a-z\p{{Ll}}\p{{Lu}}\p{{Lo}}\p{{M}}_{{()\s\\]*)))
-                    |
-                    ([a-zA-Z]+)
-                    ) # negative ends
-                    ({})
-                    (?![a-zA-Z]+)'''.format(self.escape_sym(sym))),
-                    re.MULTILINE | re.DOTALL | re.VERBOSE
-                )
-                changed = True
-                while changed:
-                    changed = False
-                    for target in PROSE_RE.finditer(content):
-                        changed = True
-                        updated = True
-                        content = content[:target.start()] + "{{\\proselabel{{{}}}{{{{{}}}}}}}".format(context,
-                                                                                               sym) + content[
-                                                                                                      target.end():]
-                        break
+                PROSE_RE = _prose_re_for(self.escape_sym(sym))
+                # The negative lookbehind rejects symbols that are already wrapped in a label,
+                # so a single pass replaces every occurrence without double-wrapping
+                new_sym = "{{\\proselabel{{{}}}{{{{{}}}}}}}".format(context, sym)
+                content, replaced = PROSE_RE.subn(lambda target: new_sym, content)
+                if replaced > 0:
+                    updated = True
             if updated:
-                text_list.append(text[start_index: m.start()])
-                start_index = m.end()
-                # print("text is{}".format(text))
-                # print("handle_math, content:{}, group:{}, full:{}".format(content, m.group(), m.group()))
-                # text = text.replace(m.group(), "{}{}{}".format(m.group(1), content, m.group(1)))
-                # print("handle_math, m.group():{}, replaced:{}".format(m.group(), "{}{}{}".format(m.group(1), content, m.group(1))))
-                text_list.append("{}{}{}".format(m.group(1), content, m.group(1)))
-                # print("handle_math, after:{}".format(text))
-        # print("after, text:{}\n".format(text))
-        text_list.append(text[start_index:len(text)])
+                return "{}{}{}".format(m.group(1), content, m.group(1))
+            return m.group()
+        text = self.MATH_RE.sub(label_equation, text)
         record("End handle_math")
-        return ''.join(text_list)
+        return text
 
     def handle_easy_span_context_math(self, text, equation_dict, span_dict):
         """
@@ -276,136 +282,65 @@ class IheartlaBlockPreprocessor(Preprocessor):
         :param span_dict: context -> dict (sym -> desc)
         :return: replaced text
         """
-        for m in self.EASY_SPAN_CONTEXT_BLOCK_RE.finditer(text):
-            sym_list = equation_dict[m.group('context')].generated_list
-            # subset_dict = equation_dict[m.group('context')].subset_dict
+        def rewrite_span(m):
+            context = m.group('context')
+            sym_list = equation_dict[context].generated_list
             found_list = []
             desc = m.group('code')
-            # sym_list = m.group('symbol').split(';')
             cur_dict = {}
-            if m.group('context') in span_dict:
-                cur_dict = span_dict[m.group('context')]
+            if context in span_dict:
+                cur_dict = span_dict[context]
             # print("easy_span_context, matched:{}".format(m.group()))
             # Multiple math blocks
-            for math in self.MATH_RE.finditer(desc):
+            def label_math(math):
                 code = math.group("code")
                 modified = False
                 for sym in sym_list:
-                    PROSE_RE = re.compile(
-                        dedent(self.SYMBOL_FORMAT.format(self.escape_sym(sym))),
-                        re.MULTILINE | re.DOTALL | re.VERBOSE
-                    )
-                    changed = True
-                    while changed:
-                        changed = False
-                        for target in PROSE_RE.finditer(code):
-                            # When a symbol is found, need to check whether it's the substring of other symbols: d_1 in \bar{d_1}
-                            # if sym in subset_dict:
-                            #     accept = True
-                            #     print("cur sym:{}, subset: {}".format(sym, subset_dict[sym]))
-                            #     for parent in subset_dict[sym]:
-                            #         PR_RE = re.compile(
-                            #             dedent(self.SYMBOL_FORMAT.format(self.escape_sym(parent))),
-                            #             re.MULTILINE | re.DOTALL | re.VERBOSE
-                            #         )
-                            #         print("cur parent:{}, code:{}".format(parent, code))
-                            #         for p_target in PR_RE.finditer(code):
-                            #             print("p_target found:{}".format(p_target.group()))
-                            #             if p_target.start() >= target.start() and target.end() <= p_target.end():
-                            #                 accept = False
-                            #                 print("subset string found:{}, {}".format(target.group(), p_target.group()))
-                            #                 break
-                            #         if not accept:
-                            #             break
-                            #     if not accept:
-                            #         continue
-                            # Accept the symbol
-                            modified = True
-                            changed = True
-                            code = code[:target.start()] + "{{\\prosedeflabel{{{}}}{{{{{}}}}}}}".format(
-                                m.group('context'), sym) + code[target.end():]
-                            found_list.append(sym)
-                            # print("code:{}".format(code))
-                            break
+                    PROSE_RE = _prose_re_for(self.escape_sym(sym))
+                    new_sym = "{{\\prosedeflabel{{{}}}{{{{{}}}}}}}".format(context, sym)
+                    code, replaced = PROSE_RE.subn(lambda target: new_sym, code)
+                    if replaced > 0:
+                        modified = True
+                        found_list.append(sym)
                 if modified:
-                    desc = desc.replace(math.group(), r"""${}$""".format(code))
+                    return r"""${}$""".format(code)
+                return math.group()
+            desc = self.MATH_RE.sub(label_math, desc)
             # print("handle_span_code, desc:{}".format(desc))
             # print("found_list:{}".format(found_list))
-            found_list = list(set(found_list))
-            for sym in found_list:
+            unique_list = list(set(found_list))
+            for sym in unique_list:
                 cur_dict[sym] = m.group('code')
-            text = text.replace(m.group(), """<span sym="{}" context="{}">{}</span>""".format(
-                ';'.join(found_list).replace('\\','\\\\').replace('"', '\\"').replace("'", "\\'"), m.group('context'), desc))
-            span_dict[m.group('context')] = cur_dict
-        # print("after, text:{}\n".format(text))
-        # print("\nafter, cur_dict:")
-        # for key, value in cur_dict.items():
-        #     print("{} : {}".format(key, value))
+            span_dict[context] = cur_dict
+            return """<span sym="{}" context="{}">{}</span>""".format(
+                ';'.join(unique_list).replace('\\','\\\\').replace('"', '\\"').replace("'", "\\'"), context, desc)
+        text = self.EASY_SPAN_CONTEXT_BLOCK_RE.sub(rewrite_span, text)
         return text, span_dict
 
     def handle_prose_label(self, text, context):
-        start_index = 0
-        text_list = []
-        for m in self.PROSE_RE.finditer(text):
-            # print("prose match: {}, def:{}, symbol:{}".format(m.group(), m.group('def'), m.group('symbol')))
-            # text = text.replace(m.group(), "{{\\prose{}label{{{}}}{{{{{}}}}}}}".format(m.group('def'), context, m.group('symbol')))
-            text_list.append(text[start_index: m.start()])
-            text_list.append("{{\\prose{}label{{{}}}{{{{{}}}}}}}".format(m.group('def'), context, m.group('symbol')))
-            start_index = m.end()
-        text_list.append(text[start_index:len(text)])
-        return ''.join(text_list)
-
-    def handle_raw_code(self, text, context):
-        start_index = 0
-        text_list = []
-        for m in self.RAW_CODE_BLOCK_RE.finditer(text):
-            # print(m.group())
-            # text = text.replace(m.group(), "{}iheartla({})\n".format(m.group('fence'), context))
-            text_list.append(text[start_index: m.start()])
-            text_list.append("{}iheartla({})\n".format(m.group('fence'), context))
-            start_index = m.end()
-        text_list.append(text[start_index:len(text)])
-        text = ''.join(text_list)
-        start_index = 0
-        text_list.clear()
-        for m in self.RAW_NUM_CODE_BLOCK_RE.finditer(text):
-            # print(m.group())
-            # text = text.replace(m.group(), "{}iheartla({}, unnumbered)\n".format(m.group('fence'), context))
-            text_list.append(text[start_index: m.start()])
-            text_list.append("{}iheartla({}, unnumbered)\n".format(m.group('fence'), context))
-            start_index = m.end()
-        text_list.append(text[start_index:len(text)])
-        return ''.join(text_list)
-
-    def handle_inline_raw_code(self, text, context):
-        start_index = 0
-        text_list = []
-        for m in self.RAW_CODE_INLINE_RE.finditer(text):
-            # print("inline_raw_code: {}".format(m.group()))
-            if not self.INLINE_RE.fullmatch(m.group()):
-                # print("new: {}".format("❤ {}:{}❤".format(context, m.group('code'))))
-                # text = text.replace(m.group(), "❤ {}:{}❤".format(context, m.group('code')))
-                text_list.append(text[start_index: m.start()])
-                text_list.append("❤ {}:{}❤".format(context, m.group('code')))
-                start_index = m.end()
-        text_list.append(text[start_index:len(text)])
-        return ''.join(text_list)
+        if '\\prose' not in text:
+            # cheap substring probe before running the regex
+            return text
+        return self.PROSE_RE.sub(
+            lambda m: "{{\\prose{}label{{{}}}{{{{{}}}}}}}".format(m.group('def'), context, m.group('symbol')),
+            text)
 
-    def handle_raw_span_code(self, text, context):
+    def handle_raw_combined(self, text, context):
         """
-        add context name to span tag -> def:context:symbol
+        add context name to raw fences (``` iheartla), inline code (❤code❤)
+        and simple span tags (def:symbol) in a single pass
         """
-        start_index = 0
-        text_list = []
-        for m in self.SPAN_SIMPLE_RE.finditer(text):
-            # print("simple_span_code: {}".format(m.group()))
-            # print("new: {}".format('<span class="def:{}:{}"> {} </span>'.format(context, m.group('symbol'), m.group('code'))))
-            # text = text.replace(m.group(), '<span class="def:{}:{}"> {} </span>'.format(context, m.group('symbol'), m.group('code')))
-            text_list.append(text[start_index: m.start()])
-            text_list.append('<span class="def:{}:{}">{}</span>'.format(context, m.group('symbol'), m.group('code')))
-            start_index = m.end()
-        text_list.append(text[start_index:len(text)])
-        return ''.join(text_list)
+        def dispatch(m):
+            if m.group('bfence') is not None:
+                if m.group('unnumbered') is not None:
+                    return "{}iheartla({}, unnumbered)\n".format(m.group('bfence'), context)
+                return "{}iheartla({})\n".format(m.group('bfence'), context)
+            if m.group('icode') is not None:
+                if self.INLINE_RE.fullmatch(m.group()):
+                    return m.group()
+                return "❤ {}:{}❤".format(context, m.group('icode'))
+            return '<span class="def:{}:{}">{}</span>'.format(context, m.group('ssymbol'), m.group('scode'))
+        return self.RAW_COMBINED_RE.sub(dispatch, text)
 
     def handle_easy_span_code(self, text, context):
         """
@@ -414,62 +349,51 @@ class IheartlaBlockPreprocessor(Preprocessor):
         :param context: current context name
         :return: replaced text
         """
-        start_index = 0
-        text_list = []
-        for m in self.EASY_SPAN_BLOCK_RE.finditer(text):
-            # print("easy_span_code: {}".format(m.group()))
-            # print("new: {}".format('<span class="def:{}:{}"> {} </span>'.format(context, m.group('symbol'), m.group('code'))))
-            # text = text.replace(m.group(), '<span class="def:{}"> {} </span>'.format(context, m.group('code')))
-            text_list.append(text[start_index: m.start()])
-            text_list.append('<span class="def:{}">{}</span>'.format(context, m.group('code')))
-            start_index = m.end()
-        text_list.append(text[start_index:len(text)])
-        return ''.join(text_list)
+        return self.EASY_SPAN_BLOCK_RE.sub(
+            lambda m: '<span class="def:{}">{}</span>'.format(context, m.group('code')),
+            text)
 
     def handle_span_code(self, text):
         """
         Based on the symbol list in the span tag, search and replace the math block in the span
         """
         span_dict = {}
-        for m in self.SPAN_BLOCK_RE.finditer(text):
+        def rewrite_span(m):
+            context = m.group('context')
             cur_dict = {}
-            if m.group('context') in span_dict:
-                cur_dict = span_dict[m.group('context')]
+            if context in span_dict:
+                cur_dict = span_dict[context]
             desc = m.group('code')
             sym_list = [sym.strip() for sym in m.group('symbol').split(';')]
             for sym in sym_list:
                 cur_dict[sym] = desc
             la_debug("handle_span_code, matched:{}".format(m.group()))
             # Multiple math blocks
-            for math in self.MATH_RE.finditer(desc):
+            def label_math(math):
                 code = math.group("code")
                 modified = False
                 for sym in sym_list:
-                    PROSE_RE = re.compile(
-                        dedent(self.SYMBOL_FORMAT.format(self.escape_sym(sym))),
-                        re.MULTILINE | re.DOTALL | re.VERBOSE
-                    )
-                    changed = True
-                    while changed:
-                        changed = False
-                        for target in PROSE_RE.finditer(code):
-                            modified = True
-                            changed = True
-                            code = code[:target.start()] + "{{\\prosedeflabel{{{}}}{{{{{}}}}}}}".format(m.group('context'), sym) + code[target.end():]
-                            # print("code:{}".format(code))
-                            break
+                    PROSE_RE = _prose_re_for(self.escape_sym(sym))
+                    new_sym = "{{\\prosedeflabel{{{}}}{{{{{}}}}}}}".format(context, sym)
+                    code, replaced = PROSE_RE.subn(lambda target: new_sym, code)
+                    if replaced > 0:
+                        modified = True
                 if modified:
-                    desc = desc.replace(math.group(), r"""${}$""".format(code))
+                    return r"""${}$""".format(code)
+                return math.group()
+            desc = self.MATH_RE.sub(label_math, desc)
             # print("handle_span_code, desc:{}".format(desc))
-            text = text.replace(m.group(), """<span sym="{}" context="{}">{}</span>""".format(m.group('symbol').replace('\\','\\\\').replace('"', '\\"').replace("'", "\\'"), m.group('context'), desc))
-            span_dict[m.group('context')] = cur_dict
+            span_dict[context] = cur_dict
+            return """<span sym="{}" context="{}">{}</span>""".format(m.group('symbol').replace('\\','\\\\').replace('"', '\\"').replace("'", "\\'"), context, desc)
+        text = self.SPAN_BLOCK_RE.sub(rewrite_span, text)
         return text, span_dict
 
-    def handle_context_pre(self, text):
+    def split_by_context(self, text):
         """
-        Process context and fill missing context in various blocks (iheartla code, span code)
+        Split text at the ❤ : context markers; returns the segment before each
+        marker plus the trailing segment, the context name per segment and the
+        raw matched marker strings
         """
-        record("Start handle_context_pre")
         start_index = 0
         text_list = []
         context_list = ['']
@@ -481,35 +405,35 @@ class IheartlaBlockPreprocessor(Preprocessor):
             text_list.append(text[start_index: m.start()])
             start_index = m.end()
         text_list.append(text[start_index:len(text)])
-        full_text = ''
+        return text_list, context_list, matched_list
+
+    def handle_context_pre(self, text):
+        """
+        Process context and fill missing context in various blocks (iheartla code, span code)
+        """
+        record("Start handle_context_pre")
+        text_list, context_list, matched_list = self.split_by_context(text)
+        parts = []
         for index in range(len(text_list)):
-            full_text += matched_list[index]
-            text_list[index] = self.handle_raw_code(text_list[index], context_list[index])
-            text_list[index] = self.handle_inline_raw_code(text_list[index], context_list[index])
-            text_list[index] = self.handle_raw_span_code(text_list[index], context_list[index])
+            parts.append(matched_list[index])
+            text_list[index] = self.handle_raw_combined(text_list[index], context_list[index])
             text_list[index] = self.handle_easy_span_code(text_list[index], context_list[index])
-            full_text += text_list[index]
+            parts.append(text_list[index])
             # text_list[index] = self.handle_prose_label(text_list[index], context_list[index])
         record("End handle_context_pre")
-        return full_text, context_list
+        return ''.join(parts), context_list
 
-    def handle_context_post(self, text, equation_dict):
+    def handle_context_post(self, text, equation_dict, context_list=None):
         """
         Process context and fill missing context based on the symbols generated by iheartla block
         (prose label, symbols in both iheartla and latex)
         """
-        start_index = 0
-        text_list = []
-        context_list = ['']
-        raw_context = ['']
-        for m in self.CONTEXT_RE.finditer(text):
-            # print("parsed context: {}".format(m.group('context')))
-            cur_context = m.group('context').strip()
-            context_list.append(cur_context)
-            raw_context.append(m.group())
-            text_list.append(text[start_index: m.start()])
-            start_index = m.end()
-        text_list.append(text[start_index:len(text)])
+        # The compile passes replace blocks with stash tokens that never contain a
+        # context marker, so the names found by handle_context_pre are still valid;
+        # only the segment offsets have to be re-derived from the mutated text
+        text_list, found_context_list, raw_context = self.split_by_context(text)
+        if context_list is None or len(context_list) != len(found_context_list):
+            context_list = found_context_list
         for index in range(len(text_list)):
             sym_list = []
             cur_context = context_list[index]
@@ -546,7 +470,7 @@ class IheartlaBlockPreprocessor(Preprocessor):
                     folder = "{}/{}".format(self.md.path, IMG_CODE)
                     if not os.path.exists(folder):
                         os.mkdir(folder)
-                    save_to_file(code, "{}/{}.py".format(folder, name))
+                    self._write_if_changed(code, "{}/{}.py".format(folder, name))
                     self.md.figure_list.append(name)
                     # import os
                     # save_to_file(code, "{}/extras/resource/img/fig3.py".format(os.getcwd()))
@@ -580,10 +504,10 @@ class IheartlaBlockPreprocessor(Preprocessor):
             if '.' in module_name and self.BLANK_RE.fullmatch(code):
                 code = read_from_file("{}/{}".format(self.md.path, module_name))
             if module_name and code:
-                if module_name not in file_dict:
-                    file_dict[module_name] = BlockData([m], [code], [m.group(0)], [True], [False], module_name)
-                else:
-                    file_dict[module_name].add(m, code, m.group(0), True, False)
+                block_data = file_dict.get(module_name)
+                if block_data is None:
+                    block_data = file_dict[module_name] = BlockData(module_name=module_name)
+                block_data.add(m, code, m.group(0), True, False)
         # Find all blocks
         for m in self.FENCED_BLOCK_RE.finditer(text):
             module_attr_list = m.group('module').strip().split(',')
@@ -596,20 +520,22 @@ class IheartlaBlockPreprocessor(Preprocessor):
             if '.' in module_name and self.BLANK_RE.fullmatch(code):
                 code = read_from_file("{}/{}".format(self.md.path, module_name))
             if module_name and code:
-                if module_name not in file_dict:
-                    file_dict[module_name] = BlockData([m], [code], [m.group(0)], [False], [numbered], module_name)
-                else:
-                    file_dict[module_name].add(m, code, m.group(0), False, numbered)
+                block_data = file_dict.get(module_name)
+                if block_data is None:
+                    block_data = file_dict[module_name] = BlockData(module_name=module_name)
+                block_data.add(m, code, m.group(0), False, numbered)
         # Save to file
         if not WHEEL_MODE:
             for name, block_data in file_dict.items():
                 source = '\n'.join(block_data.code_list)
                 file_name = "{}/{}.ihla".format(self.md.path, name)
-                save_to_file(source, file_name)
+                self._write_if_changed(source, file_name)
         # compile
         equation_dict = {}
         full_code_sequence = []
         record("Before compiling iheartla code")
+        # (start, end, replacement) spans of the original blocks, spliced in one pass at the end
+        replace_spans = []
         new_cached_data = {}
         global cached_data
         self.md.changed_dict.clear()
@@ -633,22 +559,27 @@ class IheartlaBlockPreprocessor(Preprocessor):
                 return d
             full_code_sequence.append( dict_without( code_dict, [ ParserTypeEnum.MATHJAX, ParserTypeEnum.MACROMATHJAX ] ) )
             # Find all expr for each original iheartla block
-            index_dict = {}
+            index_dict = defaultdict(list)
             expr_dict = code_dict[ParserTypeEnum.MACROMATHJAX].expr_dict
             expr_raw_dict = code_dict[ParserTypeEnum.MATHJAX].expr_dict
-            for raw_text, math_code in expr_dict.items():
-                for cur_index in range(len(block_data.code_list)):
-                    if raw_text in block_data.code_list[cur_index]:
-                        if cur_index not in index_dict:
-                            index_dict[cur_index] = [raw_text]
-                        else:
+            if expr_dict:
+                # One alternation scan per block instead of an O(exprs * blocks)
+                # substring search; longer exprs go first so an expr containing
+                # another is preferred over its substring
+                expr_alt_re = re.compile('|'.join(map(re.escape, sorted(expr_dict.keys(), key=len, reverse=True))))
+                assigned = set()
+                for cur_index, block_code in enumerate(block_data.code_list):
+                    for expr_m in expr_alt_re.finditer(block_code):
+                        raw_text = expr_m.group()
+                        if raw_text not in assigned:
+                            assigned.add(raw_text)
                             index_dict[cur_index].append(raw_text)
-                        break
             # Replace math code
             for cur_index in range(len(block_data.code_list)):
-                if cur_index not in index_dict.keys():
+                if cur_index not in index_dict:
                     # code block with only parameters
-                    text = text.replace(block_data.block_list[cur_index], '')
+                    block_match = block_data.match_list[cur_index]
+                    replace_spans.append((block_match.start(), block_match.end(), ''))
                     replace_dict[block_data.block_list[cur_index]] = ''
                     math_dict[block_data.block_list[cur_index]] = ''
                     continue
@@ -657,17 +588,11 @@ class IheartlaBlockPreprocessor(Preprocessor):
                     content = expr_dict[raw_str]
                     raw_content = expr_raw_dict[raw_str]
                 else:
-                    # more than one expr in a single block
-                    order_list = []
-                    for raw_str in index_dict[cur_index]:
-                        order_list.append(text.index(raw_str))
-                    sorted_index = sorted(range(len(order_list)), key=lambda k: order_list[k])
-                    content = ''
-                    raw_content = ''
-                    for cur in range(len(sorted_index)):
-                        raw_str = index_dict[cur_index][sorted_index[cur]]
-                        content += expr_dict[raw_str]
-                        raw_content += expr_raw_dict[raw_str]
+                    # more than one expr in a single block, order them by position in the block
+                    block_text = block_data.code_list[cur_index]
+                    raw_list = sorted(index_dict[cur_index], key=block_text.index)
+                    content = ''.join(expr_dict[raw_str] for raw_str in raw_list)
+                    raw_content = ''.join(expr_raw_dict[raw_str] for raw_str in raw_list)
                 original_block = block_data.block_list[cur_index]
                 if block_data.inline_list[cur_index]:
                     raw_math = r"""$\begin{{align*}}{}\end{{align*}}$""".format(raw_content)
@@ -689,10 +614,23 @@ class IheartlaBlockPreprocessor(Preprocessor):
                 stashed = self.md.htmlStash.store(content)
                 stashed_dict[stashed] = raw_math
                 content = stashed
-                text = text.replace(block_data.block_list[cur_index], content)
-                # text = text.replace(block_data.block_list[cur_index], content)
+                block_match = block_data.match_list[cur_index]
+                replace_spans.append((block_match.start(), block_match.end(), content))
                 # replace_dict[block_data.block_list[cur_index]] = content
                 math_dict[block_data.block_list[cur_index]] = raw_math
+        # Splice all replacements in a single pass instead of one text.replace per block
+        if replace_spans:
+            replace_spans.sort(key=lambda span: span[0])
+            pieces = []
+            last = 0
+            for start, end, replacement in replace_spans:
+                if start < last:
+                    continue
+                pieces.append(text[last:start])
+                pieces.append(replacement)
+                last = end
+            pieces.append(text[last:])
+            text = ''.join(pieces)
         cached_data = new_cached_data
         record("After compiling iheartla code")
         self.save_code(full_code_sequence)
@@ -700,8 +638,7 @@ class IheartlaBlockPreprocessor(Preprocessor):
 
 
     def handle_reference(self, text):
-        res_list = self.REFERENCE_RE.findall(text)
-        if len(res_list) == 0 and self.md.Meta.get("full_paper", False):
+        if self.REFERENCE_RE.search(text) is None and self.md.Meta.get("full_paper", False):
             text += "\n# REFERENCE\n"
         # ref_list = []
         # for m in self.REFERENCE_RE.finditer(text):
@@ -746,7 +683,7 @@ class IheartlaBlockPreprocessor(Preprocessor):
                         # print("sym:{}, k:{}".format(sym, k))
         equation_dict = self.merge_desc(equation_dict, span_dict)
         self.process_metadata(equation_dict, context_list)
-        text = self.handle_context_post(text, equation_dict)
+        text = self.handle_context_post(text, equation_dict, context_list)
         # print(text)
         # for k, v in replace_dict.items():
         #     text = text.replace(k, v)
@@ -763,11 +700,8 @@ class IheartlaBlockPreprocessor(Preprocessor):
         json_list = []
         for name, equation_data in equation_dict.items():
             json_list.append('''{{"name":"{}", {} }}'''.format(name, equation_data.gen_json_content()))
-        context_json_list = []
-        for context in context_list:
-            if context != '':
-                context_json_list.append('"{}"'.format(context))
-        json_content = '''{{"equations":[{}], "context":[{}] }}'''.format(','.join(json_list), ','.join(context_json_list))
+        context_json = json.dumps([context for context in context_list if context != ''], ensure_ascii=False)
+        json_content = '''{{"equations":[{}], "context":{} }}'''.format(','.join(json_list), context_json)
         if json_content is not None:
             # save_to_file(json_content, "{}/data.json".format(self.md.path))
             self.md.json_data = json_content
@@ -801,14 +735,14 @@ class IheartlaBlockPreprocessor(Preprocessor):
         pass
 
     def save_code(self, full_code_sequence):
-        # For every type of code
-        for cur_type in ParserTypeEnum:
+        # Only the types save_with_type acts on; building frame lists for the
+        # other parser types would be pure waste since they are discarded.
+        for cur_type in (ParserTypeEnum.EIGEN, ParserTypeEnum.NUMPY, ParserTypeEnum.MATLAB):
             # If we're looking for it
             if self.md.parser_type & cur_type:
                 # Take all of the snippets from the `full_code_sequence`, which
                 # is a list of `compile_la_content()` output.
                 frame_list = [ code[cur_type] for code in full_code_sequence ]
-                # Save the snippets. (The save function will ignore un-savable data.)
                 self.save_with_type( frame_list, cur_type )
 
     def save_with_type(self, code_frame_list, parser_type):
@@ -820,31 +754,21 @@ class IheartlaBlockPreprocessor(Preprocessor):
             self.save_matlab(code_frame_list)
 
     def save_cpp(self, code_frame_list):
-        lib_header = None
-        lib_content = ''
-        for code_frame in code_frame_list:
-            if lib_header is None:
-                lib_header = code_frame.include
-            lib_content += code_frame.struct + '\n'
+        lib_header = next((code_frame.include for code_frame in code_frame_list if code_frame.include is not None), None)
+        lib_content = ''.join(code_frame.struct + '\n' for code_frame in code_frame_list)
         if lib_header is not None:
             self.md.lib_cpp = "#pragma once\n" + lib_header + lib_content
             # save_to_file("#pragma once\n" + lib_header + lib_content, "{}/lib.h".format(self.md.path))
 
     def save_python(self, code_frame_list):
-        lib_header = None
-        lib_content = ''
-        for code_frame in code_frame_list:
-            if lib_header is None:
-                lib_header = code_frame.include
-            lib_content += code_frame.struct + '\n'
+        lib_header = next((code_frame.include for code_frame in code_frame_list if code_frame.include is not None), None)
+        lib_content = ''.join(code_frame.struct + '\n' for code_frame in code_frame_list)
         if lib_header is not None:
             self.md.lib_py = lib_header + lib_content
             # save_to_file(lib_header + lib_content, "{}/lib.py".format(self.md.path))
 
     def save_matlab(self, code_frame_list):
-        lib_content = ''
-        for code_frame in code_frame_list:
-            lib_content += code_frame.struct + '\n'
+        lib_content = ''.join(code_frame.struct + '\n' for code_frame in code_frame_list)
         if lib_content != '':
             self.md.lib_matlab = lib_content
             # save_to_file(lib_content, "{}/lib.m".format(self.md.path))
@@ -864,89 +788,91 @@ class IheartlaBlockPreprocessor(Preprocessor):
         node_dict = {}
         for equation in equation_list:
             undescribed_list = []
+            symtable = equation.symtable
+            desc_dict = equation.desc_dict
+            module_name = equation.name
             # parameters
             for param in equation.parameters:
-                sym_eq_data = SymEquationData(la_type=equation.symtable[param], desc=equation.desc_dict.get(param), module_name=equation.name, is_defined=False)
-                if param not in sym_dict:
-                    sym_data = SymData(param, sym_equation_list=[sym_eq_data])
+                sym_eq_data = SymEquationData(la_type=symtable[param], desc=desc_dict.get(param), module_name=module_name, is_defined=False)
+                sym_data = sym_dict.get(param)
+                if sym_data is None:
+                    sym_dict[param] = SymData(param, sym_equation_list=[sym_eq_data])
                     node_dict[param] = SymNode(param)
-                    sym_dict[param] = sym_data
                 else:
-                    sym_data = sym_dict[param]
                     sym_data.sym_equation_list.append(sym_eq_data)
                 if sym_eq_data.desc is None or sym_eq_data.desc == '':
                     undescribed_list.append(param)
             # new symbols
             for definition in equation.definition:
-                sym_eq_data = SymEquationData(la_type=equation.symtable[definition], desc=equation.desc_dict.get(definition), module_name=equation.name, is_defined=True)
-                if definition not in sym_dict:
-                    sym_data = SymData(definition, sym_equation_list=[sym_eq_data])
+                sym_eq_data = SymEquationData(la_type=symtable[definition], desc=desc_dict.get(definition), module_name=module_name, is_defined=True)
+                sym_data = sym_dict.get(definition)
+                if sym_data is None:
+                    sym_dict[definition] = SymData(definition, sym_equation_list=[sym_eq_data])
                     node_dict[definition] = SymNode(definition)
-                    sym_dict[definition] = sym_data
                 else:
-                    sym_data = sym_dict[definition]
                     sym_data.sym_equation_list.append(sym_eq_data)
                 if sym_eq_data.desc is None or sym_eq_data.desc == '':
                     undescribed_list.append(definition)
             # optimized symbols
             for opt_var in equation.opt_syms:
                 if opt_var not in equation.parameters and opt_var not in equation.definition:
-                    sym_eq_data = SymEquationData(la_type=equation.symtable[opt_var], desc=equation.desc_dict.get(opt_var), module_name=equation.name, is_defined=True)
-                    if opt_var not in sym_dict:
-                        sym_data = SymData(opt_var, sym_equation_list=[sym_eq_data])
+                    sym_eq_data = SymEquationData(la_type=symtable[opt_var], desc=desc_dict.get(opt_var), module_name=module_name, is_defined=True)
+                    sym_data = sym_dict.get(opt_var)
+                    if sym_data is None:
+                        sym_dict[opt_var] = SymData(opt_var, sym_equation_list=[sym_eq_data])
                         node_dict[opt_var] = SymNode(opt_var)
-                        sym_dict[opt_var] = sym_data
                     else:
-                        sym_data = sym_dict[opt_var]
                         sym_data.sym_equation_list.append(sym_eq_data)
                     if sym_eq_data.desc is None or sym_eq_data.desc == '':
                         undescribed_list.append(opt_var)
             # local functions
             for func_name, func_params in equation.func_data_dict.items():
-                sym_eq_data = SymEquationData(la_type=equation.symtable[func_name], desc=equation.desc_dict.get(func_name), module_name=equation.name, is_defined=True)
-                if func_name not in sym_dict:
-                    sym_data = SymData(func_name, sym_equation_list=[sym_eq_data])
+                sym_eq_data = SymEquationData(la_type=symtable[func_name], desc=desc_dict.get(func_name), module_name=module_name, is_defined=True)
+                sym_data = sym_dict.get(func_name)
+                if sym_data is None:
+                    sym_dict[func_name] = SymData(func_name, sym_equation_list=[sym_eq_data])
                     node_dict[func_name] = SymNode(func_name)
-                    sym_dict[func_name] = sym_data
                 else:
-                    sym_data = sym_dict[func_name]
                     sym_data.sym_equation_list.append(sym_eq_data)
                 if sym_eq_data.desc is None or sym_eq_data.desc == '':
                     undescribed_list.append(func_name)
                 for local_param in func_params.params_data.parameters:
-                    param_eq_data = SymEquationData(la_type=func_params.params_data.symtable[local_param],
-                                                    desc=equation.desc_dict.get(local_param), module_name=equation.name,
-                                                    is_defined=False)
-                    if local_param not in sym_dict:
-                        sym_data = SymData(local_param, sym_equation_list=[param_eq_data])
+                    param_desc = desc_dict.get(local_param)
+                    sym_data = sym_dict.get(local_param)
+                    if sym_data is None:
+                        param_eq_data = SymEquationData(la_type=func_params.params_data.symtable[local_param],
+                                                        desc=param_desc, module_name=module_name,
+                                                        is_defined=False)
+                        sym_dict[local_param] = SymData(local_param, sym_equation_list=[param_eq_data])
                         node_dict[local_param] = SymNode(local_param)
-                        sym_dict[local_param] = sym_data
                     else:
                         # In a context, there may be multiple local parameters, check
-                        sym_data = sym_dict[local_param]
                         existed = False
                         for cur_eq_data in sym_data.sym_equation_list:
-                            if cur_eq_data.module_name == param_eq_data.module_name:
+                            if cur_eq_data.module_name == module_name:
                                 existed = True
-                                # print("existed, name:{}, desc:{}".format(local_param, param_eq_data.desc))
-                                if cur_eq_data.desc == '' and param_eq_data.desc != '':
-                                    cur_eq_data.desc = param_eq_data.desc
-                                    # print("Update param desc, name:{}, desc:{}".format(local_param, param_eq_data.desc))
+                                # print("existed, name:{}, desc:{}".format(local_param, param_desc))
+                                if cur_eq_data.desc == '' and param_desc != '':
+                                    cur_eq_data.desc = param_desc
+                                    # print("Update param desc, name:{}, desc:{}".format(local_param, param_desc))
                         if not existed:
-                            sym_data.sym_equation_list.append(param_eq_data)
-                    if param_eq_data.desc is None or param_eq_data.desc == '':
+                            # the entry is only allocated when it is actually kept
+                            sym_data.sym_equation_list.append(
+                                SymEquationData(la_type=func_params.params_data.symtable[local_param],
+                                                desc=param_desc, module_name=module_name,
+                                                is_defined=False))
+                    if param_desc is None or param_desc == '':
                         undescribed_list.append(local_param)
             for dep_data in equation.dependence:
                 for dep_sym in dep_data.name_list:
-                    sym_eq_data = SymEquationData(la_type=equation.symtable[dep_sym],
-                                                  desc=equation.desc_dict.get(dep_sym), module_name=equation.name,
+                    sym_eq_data = SymEquationData(la_type=symtable[dep_sym],
+                                                  desc=desc_dict.get(dep_sym), module_name=module_name,
                                                   is_defined=True)
-                    if dep_sym not in sym_dict:
-                        sym_data = SymData(dep_sym, sym_equation_list=[sym_eq_data])
+                    sym_data = sym_dict.get(dep_sym)
+                    if sym_data is None:
+                        sym_dict[dep_sym] = SymData(dep_sym, sym_equation_list=[sym_eq_data])
                         node_dict[dep_sym] = SymNode(dep_sym)
-                        sym_dict[dep_sym] = sym_data
                     else:
-                        sym_data = sym_dict[dep_sym]
                         sym_data.sym_equation_list.append(sym_eq_data)
             # expr list
             for sym_list in equation.expr_dict.values():
@@ -977,25 +903,8 @@ class IheartlaBlockPreprocessor(Preprocessor):
         """
         Implementation of Algorithm 3 from https://arxiv.org/pdf/2104.13755.pdf
         """
-        # sort keys
-        sym_list = list(node_dict.keys())
-        def partition(arr, low, high):
-            i = (low - 1)
-            pivot = len(node_dict[arr[high]].neighbors)
-            for j in range(low, high):
-                if len(node_dict[arr[j]].neighbors) <= pivot:
-                    i = i + 1
-                    arr[i], arr[j] = arr[j], arr[i]
-            arr[i + 1], arr[high] = arr[high], arr[i + 1]
-            return (i + 1)
-        def quickSort(arr, low, high):
-            if len(arr) == 1:
-                return arr
-            if low < high:
-                pi = partition(arr, low, high)
-                quickSort(arr, low, pi - 1)
-                quickSort(arr, pi + 1, high)
-        quickSort(sym_list, 0, len(sym_list)-1)
+        # sort keys by degree, ascending (the greedy coloring below walks them in reverse)
+        sym_list = sorted(node_dict.keys(), key=lambda sym: len(node_dict[sym].neighbors))
         # assign colors
         pallette = []
         color_dict = {}
@@ -1008,89 +917,88 @@ class IheartlaBlockPreprocessor(Preprocessor):
                 all_colors = get_color_list()
             return all_colors.pop(0)
         def get_neighbor_colors(sym):
-            nei_colors = []
-            for nei in node_dict[sym].neighbors:
-                if nei in color_dict:
-                    nei_colors.append(color_dict[nei])
-            return nei_colors
+            return {color_dict[nei] for nei in node_dict[sym].neighbors if nei in color_dict}
+        used_palette = set()
         sym_list.reverse()
         for cur_sym in sym_list:
             cur_nei_colors = get_neighbor_colors(cur_sym)
-            c = None
-            for cur_color in pallette:
-                if cur_color not in cur_nei_colors:
-                    c = cur_color
-                    break
+            c = next((cur_color for cur_color in pallette if cur_color not in cur_nei_colors), None)
             if c is None:
                 c = get_new_color(all_colors)
-                pallette.append(c)
-            else:
-                # shuffle c to the back of pallete
-                pallette.remove(c)
-                pallette.append(c)
+                if c not in used_palette:
+                    used_palette.add(c)
+                    pallette.append(c)
+                    color_dict[cur_sym] = c
+                    continue
+            # shuffle c to the back of pallete
+            pallette.remove(c)
+            pallette.append(c)
             color_dict[cur_sym] = c
         for cur_sym, cur_color in color_dict.items():
             if cur_sym in sym_dict:
                 sym_dict[cur_sym].color = cur_color
 
     def get_sym_json(self, sym_dict):
-        sym_list = []
+        sym_json = {}
         for sym, sym_data in sym_dict.items():
             eq_data_list = []
             for sym_eq_data in sym_data.sym_equation_list:
-                used_list_str = '[]'
-                if len(sym_eq_data.used_list) > 0:
-                    used_list_str = '"' + '","'.join(sym_eq_data.used_list) + '"'
                 cur_desc = sym_eq_data.desc
-                # if sym_eq_data.desc:
-                #     cur_desc = cur_desc.replace('\\', '\\\\\\\\').replace('"', '\\\\"').replace("'", "\\\\'")
                 if not cur_desc:
                     la_warning("missing description for sym {}".format(sym))
                     # print("missing description for sym {}".format(sym))
-                # print("sym:{}, sym_eq_data.desc:{}".format(sym, sym_eq_data.desc))
-                cur_desc = base64_encode(cur_desc)
-                eq_data_list.append('''{{"desc":"{}", "type_info":{}, "def_module":"{}", "is_defined":{}, "used_equations":{}, "color":"{}"}}'''.format(
-                    cur_desc, sym_eq_data.la_type.get_json_content(),
-                    sym_eq_data.module_name, "true" if sym_eq_data.is_defined else "false", used_list_str,
-                    sym_data.color))
-            sym_list.append('''"{}":[{}]'''.format(sym.replace('\\', '\\\\\\\\').replace('"', '\\"').replace("'", "\\'"), ",".join(eq_data_list)))
-        content = '''{{{}}}'''.format(','.join(sym_list))
+                eq_data_list.append({
+                    "desc": base64_encode(cur_desc),
+                    "type_info": json.loads(sym_eq_data.la_type.get_json_content()),
+                    "def_module": sym_eq_data.module_name,
+                    "is_defined": sym_eq_data.is_defined,
+                    "used_equations": sym_eq_data.used_list,
+                    "color": sym_data.color,
+                })
+            # the front end decodes the symbol name twice, so backslashes stay doubly escaped
+            sym_json[sym.replace('\\', '\\\\')] = eq_data_list
+        content = json.dumps(sym_json, ensure_ascii=False)
         content = content.replace('`', '')
         return content
 
 
 class SymNode(object):
     def __init__(self, name='', neighbors=None):
-        if neighbors is None:
-            neighbors = []
         self.name = name
-        self.neighbors = neighbors
+        # list keeps first-seen order for deterministic coloring, the
+        # shadow set keeps membership checks O(1)
+        self.neighbors = []
+        self._neighbor_set = set()
+        if neighbors is not None:
+            self.add_neighbors(neighbors)
 
     def add_neighbors(self, neighbors=None):
-        if neighbors is None:
-            neighbors = []
+        if not neighbors:
+            return
         for nei in neighbors:
-            if (nei != self.name) and (nei not in self.neighbors):
+            if nei != self.name and nei not in self._neighbor_set:
+                self._neighbor_set.add(nei)
                 self.neighbors.append(nei)
 
 
 class SymEquationData(object):
+    __slots__ = ("la_type", "desc", "module_name", "is_defined", "used_list")
+
     def __init__(self, la_type, desc=None, module_name='', is_defined=True, used_list=None):
-        if used_list is None:
-            used_list = []
         self.la_type = la_type            # type info
         self.desc = desc                  # comment for the symbol
         self.module_name = module_name    # the module that defines the symbol
         self.is_defined = is_defined      # whether defined or from parameters
-        self.used_list = used_list        # the modules that import the symbol
+        # the modules that import the symbol
+        self.used_list = used_list if used_list is not None else []
 
 
 class SymData(object):
+    __slots__ = ("sym_name", "sym_equation_list", "color")
+
     def __init__(self, sym_name, sym_equation_list=None, color=None):
-        if sym_equation_list is None:
-            sym_equation_list = []
         self.sym_name = sym_name
-        self.sym_equation_list = sym_equation_list
+        self.sym_equation_list = sym_equation_list if sym_equation_list is not None else []
         self.color = color
 
 
@@ -10,6 +10,7 @@ Adds support for displaying math formulas using
 Author: 2015-2020, Dmitry Shachnev <mitya57@gmail.com>.
 '''
 
+import re
 from xml.etree.ElementTree import Element
 from . import Extension, WHEEL_MODE
 if WHEEL_MODE:
@@ -22,20 +23,27 @@ else:
     from ..extensions import Extension
     from ..preprocessors import Preprocessor
     from ..util import AtomicString
-import cgi
+
+# Compiled once at module scope; Pattern.__init__ recompiles its wrapped form
+# per Markdown instance, so the shared compiled object is assigned over it.
+_MATHJAX_PATTERN = r'(?<!\\)(\$\$?)(.+?)\2'
+# re.ASCII instead of the Pattern default re.UNICODE: the expression has no
+# \w/\s/\b classes, so the flag changes nothing semantically but keeps the
+# engine off the Unicode property tables.
+_MATHJAX_RE = re.compile(r"^(.*?)%s(.*)$" % _MATHJAX_PATTERN, re.DOTALL | re.ASCII)
 
 
 class MathJaxPattern(Pattern):
 
     def __init__(self, md):
-        Pattern.__init__(self, r'(?<!\\)(\$\$?)(.+?)\2', md)
+        Pattern.__init__(self, _MATHJAX_PATTERN, md)
+        self.compiled_re = _MATHJAX_RE
 
     def handleMatch(self, m):
-        # Pass the math code through, unmodified except for basic entity substitutions.
-        # Stored in htmlStash so it doesn't get further processed by Markdown.
-        # text = cgi.escape(m.group(2) + m.group(3) + m.group(2)) # & sym
-        text = m.group(2) + m.group(3) + m.group(2)
-        return self.markdown.htmlStash.store(text)
+        # Pass the math code through unmodified, stashed so it doesn't get
+        # further processed by Markdown.
+        delim = m.group(2)
+        return self.markdown.htmlStash.store(f"{delim}{m.group(3)}{delim}")
 
 class MathJaxExtension(Extension):
     def extendMarkdown(self, md):
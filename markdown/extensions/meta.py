@@ -17,17 +17,52 @@ License: [BSD](https://opensource.org/licenses/bsd-license.php)
 
 from . import Extension
 from ..preprocessors import Preprocessor
-import re
+import functools
 import logging
+import re
 import yaml
 
 log = logging.getLogger('MARKDOWN')
 
-# Global Vars
-META_RE = re.compile(r'^[ ]{0,3}(?P<key>[A-Za-z0-9_-]+):\s*(?P<value>.*)')
-META_MORE_RE = re.compile(r'^[ ]{4,}(?P<value>.*)')
-BEGIN_RE = re.compile(r'^-{3}(\s.*)?')
-END_RE = re.compile(r'^(-{3}|\.{3})(\s.*)?')
+# Prefer the libyaml-backed loader when it is available; parsing the meta
+# block is several times faster and no arbitrary tags get constructed.
+_YamlLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+# Bind the loader once so the hot path does a plain call instead of
+# rebuilding the Loader= kwargs for every document.
+_parse_meta = functools.partial(yaml.load, Loader=_YamlLoader)
+
+# Either of these ends a YAML front-matter block.
+_META_TERMINATORS = ("---", "...")
+
+# Most front matter is a handful of plain ``key: value`` string pairs;
+# those are assembled directly below without touching libyaml. Any line
+# the YAML resolver might type-convert (numbers, booleans, dates,
+# quoting, nesting, comments) sends the whole block to the real parser.
+_SIMPLE_META_RE = re.compile(r'^([A-Za-z][A-Za-z0-9_-]*):[ \t]+(\S.*?)[ \t]*$')
+_YAML_SPECIAL = frozenset('[]{}"\'|>&*!%#@`,:?')
+_YAML_KEYWORDS = frozenset((
+    'true', 'false', 'yes', 'no', 'on', 'off', 'null', 'none', '~',
+))
+
+
+def _parse_simple_meta(meta_lines):
+    """ Build the meta dict without YAML, or return None when any line
+    needs the real parser. """
+    meta = {}
+    for line in meta_lines:
+        m = _SIMPLE_META_RE.match(line)
+        if m is None:
+            return None
+        key, value = m.group(1), m.group(2)
+        if key.lower() in _YAML_KEYWORDS:
+            return None
+        if (value[0].isdigit() or value[0] in '+-.'
+                or value.lower() in _YAML_KEYWORDS
+                or not _YAML_SPECIAL.isdisjoint(value)):
+            return None
+        meta[key] = value
+    return meta
 
 
 class MetaExtension (Extension):
@@ -48,48 +83,42 @@ class MetaPreprocessor(Preprocessor):
 
     def run(self, lines, **kwargs):
         """ Parse Meta-Data and store in Markdown.Meta. """
+        md = self.md
+        if not lines or lines[0] != "---":
+            # the overwhelmingly common case: no front matter at all, so
+            # skip the split and the YAML parser entirely
+            md.Meta = {}
+            return lines
         meta_lines, lines = self.split_by_meta_and_content(lines)
-        meta = yaml.load("\n".join(meta_lines), Loader=yaml.FullLoader)
-        self.md.Meta = meta if meta is not None else {}
-        # meta = {}
-        # key = None
-        # if lines and BEGIN_RE.match(lines[0]):
-        #     lines.pop(0)
-        # while lines:
-        #     line = lines.pop(0)
-        #     m1 = META_RE.match(line)
-        #     if line.strip() == '' or END_RE.match(line):
-        #         break  # blank line or end of YAML header - done
-        #     if m1:
-        #         key = m1.group('key').lower().strip()
-        #         value = m1.group('value').strip()
-        #         try:
-        #             meta[key].append(value)
-        #         except KeyError:
-        #             meta[key] = [value]
-        #     else:
-        #         m2 = META_MORE_RE.match(line)
-        #         if m2 and key:
-        #             # Add another line to existing key
-        #             meta[key].append(m2.group('value').strip())
-        #         else:
-        #             lines.insert(0, line)
-        #             break  # no meta data - done
-        # self.md.Meta = meta
+        if not meta_lines:
+            md.Meta = {}
+            return lines
+        meta = _parse_simple_meta(meta_lines)
+        if meta is None:
+            source = meta_lines[0] if len(meta_lines) == 1 else "\n".join(meta_lines)
+            # libyaml scans utf-8 bytes natively, so encoding here skips the
+            # transcode it would otherwise do on a str input
+            meta = _parse_meta(source.encode('utf-8'))
+        md.Meta = meta if meta is not None else {}
         return lines
 
     def split_by_meta_and_content(self, lines):
-        meta_lines = []
-        if lines[0] != "---":
-            return meta_lines, lines
-        lines.pop(0)
-        for line in lines:
-            if line in ("---", "..."):
-                content_starts_at = lines.index(line) + 1
-                lines = lines[content_starts_at:]
-                break
-            meta_lines.append(line)
-        return meta_lines, lines
+        if not lines or lines[0] != "---":
+            return [], lines
+        lines = lines[1:]
+        # list.index scans at C speed; take the nearest of the two
+        # terminators instead of walking the lines one by one in Python
+        end = None
+        for terminator in _META_TERMINATORS:
+            try:
+                i = lines.index(terminator)
+            except ValueError:
+                continue
+            if end is None or i < end:
+                end = i
+        if end is None:
+            return list(lines), lines
+        return lines[:end], lines[end + 1:]
 
 
 def makeExtension(**kwargs):  # pragma: no cover